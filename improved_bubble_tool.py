@@ -8,137 +8,209 @@ and includes manual fallback options.
 Author: Manus AI
 """
 
+import io
 import os
 import sys
 import argparse
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, ALL_COMPLETED, wait
 import cv2
 import numpy as np
-from pdf2image import convert_from_path
-from PIL import Image, ImageDraw, ImageFont
+from pdf2image import convert_from_path, pdfinfo_from_path
+from PIL import Image
+from scipy.spatial import cKDTree
 import logging
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Resolution the detection kernel and size thresholds are expressed in
+REFERENCE_DPI = 300
+
+# Tool instance used by process pool workers, set by _init_worker
+_worker_tool = None
+
+def _init_worker(tool):
+    """Store the parent's tool instance in a process pool worker."""
+    global _worker_tool
+    _worker_tool = tool
+
+def _process_page_worker(pdf_path, page_number, use_manual):
+    """Rasterize and annotate a single page in a worker process, returning PNG bytes."""
+    image = _worker_tool.render_page(pdf_path, page_number, _worker_tool.dpi)
+    annotated_image = _worker_tool.process_image_improved(image, use_manual)
+    return _worker_tool.encode_png(annotated_image)
+
 class ImprovedBubbleDrawingTool:
-    def __init__(self):
+    def __init__(self, dpi=300, analysis_dpi=150):
+        if dpi <= 0 or analysis_dpi <= 0:
+            raise ValueError("dpi and analysis_dpi must be positive")
+        self.dpi = dpi  # Resolution of the annotated output pages
+        self.analysis_dpi = min(analysis_dpi, dpi)  # Resolution for line/text detection
         self.bubble_radius = 20
-        self.bubble_color = (255, 0, 0)  # Red
+        self.bubble_color = (255, 0, 0)  # Red (RGB)
         self.text_color = (255, 255, 255)  # White
-        self.font_size = 14
+        self.font_face = cv2.FONT_HERSHEY_SIMPLEX
+        self.font_scale = 0.6
+        self.font_thickness = 2
+        self.png_compress_level = 1  # Fast zlib setting; output is still lossless
         
-    def pdf_to_images(self, pdf_path, dpi=300):
-        """Convert PDF to list of PIL images."""
+        # Bubble numbers are almost always small, so measure them once up front
+        self._text_sizes = {number: self._measure_text(str(number)) for number in range(1000)}
+    
+    def _measure_text(self, text):
+        """Return the (width, height) of text rendered in the bubble font."""
+        size, _ = cv2.getTextSize(text, self.font_face, self.font_scale, self.font_thickness)
+        return size
+        
+    def get_page_count(self, pdf_path):
+        """Return the number of pages in the PDF, or 0 if it cannot be read."""
         try:
-            logger.info(f"Converting PDF to images: {pdf_path}")
-            images = convert_from_path(pdf_path, dpi=dpi)
-            logger.info(f"Successfully converted {len(images)} pages")
-            return images
+            return pdfinfo_from_path(pdf_path)["Pages"]
         except Exception as e:
-            logger.error(f"Error converting PDF: {e}")
-            return []
-    
-    def preprocess_image(self, pil_image):
-        """Preprocess image for better analysis."""
-        # Convert PIL to OpenCV format
-        cv_image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
+            logger.error(f"Error reading PDF info: {e}")
+            return 0
+
+    def render_page(self, pdf_path, page_number, dpi=300):
+        """Rasterize one page of a PDF (numbered from 1) as a PIL image."""
+        images = convert_from_path(pdf_path, dpi=dpi, first_page=page_number,
+                                   last_page=page_number)
+        if not images:
+            raise RuntimeError(f"No image produced for page {page_number}")
+        return images[0]
+
+    def iter_pages(self, pdf_path, dpi=300, page_count=None):
+        """Yield the pages of a PDF as PIL images, one at a time.
+
+        Each page is rasterized only when requested, so a single page image
+        is held in memory regardless of the document length.
+        """
+        if page_count is None:
+            page_count = self.get_page_count(pdf_path)
+        logger.info(f"Converting {page_count} PDF pages to images: {pdf_path}")
+        for page_number in range(1, page_count + 1):
+            yield self.render_page(pdf_path, page_number, dpi)
+
+    def preprocess_image(self, image):
+        """Preprocess an RGB PIL image or numpy array for analysis at analysis_dpi.
+        
+        The color image is returned in RGB order; it shares numpy input's buffer.
+        """
+        # numpy input is used as is; PIL input becomes a read-only copy
+        rgb_image = np.asarray(image)
         
         # Convert to grayscale
-        gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
+        gray = cv2.cvtColor(rgb_image, cv2.COLOR_RGB2GRAY)
+        
+        # Shrink to the analysis resolution; every later stage scales with
+        # the pixel count
+        if self.analysis_dpi < self.dpi:
+            factor = self.analysis_dpi / self.dpi
+            gray = cv2.resize(gray, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+        
+        # Blur, threshold and invert all work in place on a single buffer
+        thresh = np.empty_like(gray)
         
-        # Apply Gaussian blur to reduce noise
-        blurred = cv2.GaussianBlur(gray, (3, 3), 0)
+        # Apply Gaussian blur to reduce noise (3x3 is already the smallest
+        # kernel, so it is not scaled down with the analysis resolution)
+        cv2.GaussianBlur(gray, (3, 3), 0, dst=thresh)
         
-        # Apply adaptive thresholding for better line detection
-        thresh = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-                                     cv2.THRESH_BINARY, 11, 2)
+        # Apply adaptive thresholding for better line detection, over the
+        # same physical neighbourhood as an 11 px block at the reference DPI
+        block_size = max(3, round(11 * self.analysis_dpi / REFERENCE_DPI) | 1)
+        cv2.adaptiveThreshold(thresh, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
+                              cv2.THRESH_BINARY, block_size, 2, dst=thresh)
         
-        # Invert if needed (make lines black on white background)
-        if np.mean(thresh) < 127:
-            thresh = cv2.bitwise_not(thresh)
+        # Invert if needed (make lines black on white background); a 1/256
+        # sample of the pixels is enough to tell which value dominates
+        if thresh[::16, ::16].mean() < 127:
+            cv2.bitwise_not(thresh, dst=thresh)
         
-        return cv_image, gray, thresh
+        return rgb_image, gray, thresh
     
-    def detect_dimension_lines_improved(self, thresh_image):
-        """Improved dimension line detection using morphological operations."""
-        # Create kernels for detecting horizontal and vertical lines
-        horizontal_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (40, 1))
-        vertical_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, 40))
+    def _open_1d(self, image, kernel, dst=None):
+        """Morphological opening with a single-row or single-column kernel.
+        
+        Erosion and dilation are applied as separate passes so OpenCV runs
+        each as a 1-D running min/max filter along one axis. The dilation
+        runs in place on the erosion buffer, which is dst if given.
+        """
+        opened = cv2.erode(image, kernel, dst=dst)
+        return cv2.dilate(opened, kernel, dst=opened)
+    
+    def detect_dimension_lines_improved(self, thresh_image, scale=1, reference_scale=1,
+                                        scratch=None):
+        """Improved dimension line detection using morphological operations.
+        
+        scale maps thresh_image pixels to output page pixels, in which lines
+        are returned; reference_scale maps them to REFERENCE_DPI pixels, in
+        which the kernel and size filters are given. scratch, if given, is a
+        buffer shaped like thresh_image that may be overwritten.
+        """
+        kernel_length = max(1, round(40 / reference_scale))
+        
+        # Create 1-D kernels for detecting horizontal and vertical lines
+        horizontal_kernel = np.ones((1, kernel_length), dtype=np.uint8)
+        vertical_kernel = np.ones((kernel_length, 1), dtype=np.uint8)
         
         # Detect horizontal lines
-        horizontal_lines = cv2.morphologyEx(thresh_image, cv2.MORPH_OPEN, horizontal_kernel)
+        horizontal_lines = self._open_1d(thresh_image, horizontal_kernel)
         
         # Detect vertical lines
-        vertical_lines = cv2.morphologyEx(thresh_image, cv2.MORPH_OPEN, vertical_kernel)
+        vertical_lines = self._open_1d(thresh_image, vertical_kernel, dst=scratch)
         
-        # Combine horizontal and vertical lines
-        lines_image = cv2.addWeighted(horizontal_lines, 0.5, vertical_lines, 0.5, 0.0)
+        # Combine horizontal and vertical lines in place; findContours only
+        # looks at non-zero pixels, so a per-pixel max keeps the same shapes
+        lines_image = cv2.max(horizontal_lines, vertical_lines, dst=horizontal_lines)
         
         # Find contours of the lines
         contours, _ = cv2.findContours(lines_image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         
         dimension_lines = []
         for contour in contours:
-            # Get bounding rectangle
-            x, y, w, h = cv2.boundingRect(contour)
+            # Get bounding rectangle in output page coordinates, and its size
+            # in reference pixels for filtering
+            rect = cv2.boundingRect(contour)
+            x, y, w, h = (round(v * scale) for v in rect)
+            ref_w, ref_h = rect[2] * reference_scale, rect[3] * reference_scale
             
             # Filter based on aspect ratio and size
-            if w > 30 and h < 10:  # Horizontal line
+            if ref_w > 30 and ref_h < 10:  # Horizontal line
                 dimension_lines.append(('horizontal', x, y, x + w, y + h//2))
-            elif h > 30 and w < 10:  # Vertical line
+            elif ref_h > 30 and ref_w < 10:  # Vertical line
                 dimension_lines.append(('vertical', x + w//2, y, x + w//2, y + h))
         
         logger.info(f"Detected {len(dimension_lines)} dimension lines using morphological operations")
         return dimension_lines
     
-    def detect_arrowheads(self, thresh_image):
-        """Detect arrowheads in the image."""
-        # Create a kernel for detecting small triangular shapes
-        kernel = np.array([
-            [0, 0, 1, 0, 0],
-            [0, 1, 1, 1, 0],
-            [1, 1, 1, 1, 1],
-            [0, 1, 1, 1, 0],
-            [0, 0, 1, 0, 0]
-        ], dtype=np.uint8)
-        
-        # Apply morphological operations to detect arrowheads
-        arrowheads = cv2.morphologyEx(thresh_image, cv2.MORPH_HITMISS, kernel)
-        
-        # Find contours of arrowheads
-        contours, _ = cv2.findContours(arrowheads, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        arrowhead_positions = []
-        for contour in contours:
-            if cv2.contourArea(contour) > 5:  # Filter small noise
-                M = cv2.moments(contour)
-                if M["m00"] != 0:
-                    cx = int(M["m10"] / M["m00"])
-                    cy = int(M["m01"] / M["m00"])
-                    arrowhead_positions.append((cx, cy))
-        
-        logger.info(f"Detected {len(arrowhead_positions)} potential arrowheads")
-        return arrowhead_positions
-    
-    def detect_text_regions_improved(self, thresh_image):
-        """Improved text detection using connected components."""
-        # Find connected components
-        num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(
-            cv2.bitwise_not(thresh_image), connectivity=8)
-        
-        text_regions = []
-        for i in range(1, num_labels):  # Skip background (label 0)
-            x, y, w, h, area = stats[i]
-            
-            # Filter based on size and aspect ratio for text
-            if (10 < w < 200 and 8 < h < 40 and 
-                area > 50 and area < 5000):
-                
-                # Check aspect ratio (text is usually wider than tall)
-                aspect_ratio = w / h
-                if 0.5 < aspect_ratio < 15:
-                    text_regions.append((x, y, w, h))
+    def detect_text_regions_improved(self, thresh_image, scale=1, reference_scale=1,
+                                     scratch=None):
+        """Improved text detection using connected components.
+        
+        scale and reference_scale are as for detect_dimension_lines_improved:
+        regions are filtered in REFERENCE_DPI pixels and returned in output
+        page coordinates. scratch, if given, may be overwritten.
+        """
+        # Find connected components with the Spaghetti labeling algorithm
+        inverted = cv2.bitwise_not(thresh_image, dst=scratch)
+        num_labels, labels, stats, centroids = cv2.connectedComponentsWithStatsWithAlgorithm(
+            inverted, 8, cv2.CV_32S, cv2.CCL_SPAGHETTI)
+        
+        # Filter all components at once, skipping background (label 0)
+        boxes = stats[1:, :4]
+        w = boxes[:, cv2.CC_STAT_WIDTH] * reference_scale
+        h = boxes[:, cv2.CC_STAT_HEIGHT] * reference_scale
+        area = stats[1:, cv2.CC_STAT_AREA] * reference_scale ** 2
+        
+        # Filter based on size and aspect ratio for text (text is usually
+        # wider than tall); components are at least one pixel high
+        aspect_ratio = w / h
+        is_text = ((w > 10) & (w < 200) & (h > 8) & (h < 40) &
+                   (area > 50) & (area < 5000) &
+                   (aspect_ratio > 0.5) & (aspect_ratio < 15))
+        
+        text_regions = [tuple(region) for region in
+                        np.rint(boxes[is_text] * scale).astype(int).tolist()]
         
         logger.info(f"Detected {len(text_regions)} potential text regions")
         return text_regions
@@ -208,131 +280,181 @@ class ImprovedBubbleDrawingTool:
         return int(text_center_x + 40), int(text_center_y - 20)
     
     def draw_bubble_improved(self, image, position, number):
-        """Draw an improved numbered bubble on the image."""
+        """Draw an improved numbered bubble on the image in place."""
         x, y = position
         
-        # Convert OpenCV image to PIL for better text rendering
-        pil_image = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
-        draw = ImageDraw.Draw(pil_image)
-        
-        # Draw circle with border
-        draw.ellipse([x - self.bubble_radius, y - self.bubble_radius,
-                     x + self.bubble_radius, y + self.bubble_radius],
-                    fill=self.bubble_color, outline=(0, 0, 0), width=3)
-        
-        # Draw number
-        try:
-            # Try to use a default font
-            font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 
-                                    self.font_size)
-        except:
-            # Fallback to default font
-            font = ImageFont.load_default()
+        # Draw filled circle with border
+        cv2.circle(image, (x, y), self.bubble_radius, self.bubble_color, -1, cv2.LINE_AA)
+        cv2.circle(image, (x, y), self.bubble_radius, (0, 0, 0), 3, cv2.LINE_AA)
         
         # Get text size for centering
         text = str(number)
-        bbox = draw.textbbox((0, 0), text, font=font)
-        text_width = bbox[2] - bbox[0]
-        text_height = bbox[3] - bbox[1]
-        
-        # Draw text centered in bubble
-        text_x = x - text_width // 2
-        text_y = y - text_height // 2
-        draw.text((text_x, text_y), text, fill=self.text_color, font=font)
+        text_size = self._text_sizes.get(number)
+        if text_size is None:
+            text_size = self._measure_text(text)
+        text_width, text_height = text_size
+        
+        # Draw text centered in bubble (putText anchors at the baseline)
+        cv2.putText(image, text, (x - text_width // 2, y + text_height // 2),
+                    self.font_face, self.font_scale, self.text_color,
+                    self.font_thickness, cv2.LINE_AA)
+        return image
+    
+    def associate_lines_with_text(self, dimension_lines, text_regions, max_distance=150):
+        """Pair each dimension line with the nearest text region within max_distance."""
+        if not dimension_lines or not text_regions:
+            return []
         
-        # Convert back to OpenCV format
-        return cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
+        line_centers = np.array([((x1 + x2) / 2, (y1 + y2) / 2)
+                                 for _, x1, y1, x2, y2 in dimension_lines])
+        text_centers = np.array([(tx + tw / 2, ty + th / 2)
+                                 for tx, ty, tw, th in text_regions])
+        
+        # Nearest text center for every line center in one query; lines with
+        # no text within range get an infinite distance
+        distances, indices = cKDTree(text_centers).query(
+            line_centers, distance_upper_bound=max_distance)
+        
+        associations = []
+        for i, (line_info, distance, index) in enumerate(zip(dimension_lines, distances, indices)):
+            if distance < max_distance:
+                associations.append({
+                    'line': line_info,
+                    'text': text_regions[index],
+                    'dimension_id': i + 1
+                })
+        return associations
     
-    def process_image_improved(self, pil_image, use_manual=False):
-        """Process a single image with improved algorithms."""
+    def process_image_improved(self, image, use_manual=False):
+        """Process a single RGB PIL image or numpy array with improved algorithms.
+        
+        A writable numpy array is annotated in place rather than copied.
+        """
         logger.info("Processing image for dimension detection (improved)")
         
         # Preprocess image
-        cv_image, gray, thresh = self.preprocess_image(pil_image)
+        rgb_image, gray, thresh = self.preprocess_image(image)
         
         if use_manual:
             # Use manual dimensions for demonstration
-            associations = self.create_manual_dimensions(cv_image.shape)
+            associations = self.create_manual_dimensions(rgb_image.shape)
         else:
-            # Try automatic detection
-            dimension_lines = self.detect_dimension_lines_improved(thresh)
-            text_regions = self.detect_text_regions_improved(thresh)
+            # Try automatic detection on the analysis image, getting results
+            # back in page coordinates
+            scale = self.dpi / self.analysis_dpi
+            reference_scale = REFERENCE_DPI / self.analysis_dpi
+            
+            # The gray image is not needed after preprocessing, so it serves
+            # as scratch space: first for the vertical line mask, then for
+            # the inverted image that connected components runs on
+            dimension_lines = self.detect_dimension_lines_improved(
+                thresh, scale, reference_scale, scratch=gray)
+            text_regions = self.detect_text_regions_improved(
+                thresh, scale, reference_scale, scratch=gray)
             
             # Create associations
-            associations = []
-            for i, line_info in enumerate(dimension_lines):
-                # Find closest text region
-                line_type, x1, y1, x2, y2 = line_info
-                line_center_x = (x1 + x2) / 2
-                line_center_y = (y1 + y2) / 2
-                
-                min_distance = float('inf')
-                closest_text = None
-                
-                for text_region in text_regions:
-                    tx, ty, tw, th = text_region
-                    text_center_x = tx + tw / 2
-                    text_center_y = ty + th / 2
-                    
-                    distance = np.sqrt((line_center_x - text_center_x)**2 + 
-                                     (line_center_y - text_center_y)**2)
-                    
-                    if distance < 150 and distance < min_distance:
-                        min_distance = distance
-                        closest_text = text_region
-                
-                if closest_text:
-                    associations.append({
-                        'line': line_info,
-                        'text': closest_text,
-                        'dimension_id': i + 1
-                    })
-        
-        # Draw bubbles
-        result_image = cv_image.copy()
+            associations = self.associate_lines_with_text(dimension_lines, text_regions)
+        
+        # Draw bubbles directly on the RGB page, copying it only if it is a
+        # read-only view of the input and there is something to draw
+        if associations and not rgb_image.flags.writeable:
+            rgb_image = rgb_image.copy()
         for assoc in associations:
-            if use_manual:
-                position = self.find_bubble_position_improved(
-                    assoc['line'], assoc['text'], cv_image.shape)
-            else:
-                position = self.find_bubble_position_improved(
-                    assoc['line'], assoc['text'], cv_image.shape)
-            
-            result_image = self.draw_bubble_improved(result_image, position, 
-                                                   assoc['dimension_id'])
+            position = self.find_bubble_position_improved(
+                assoc['line'], assoc['text'], rgb_image.shape)
+            self.draw_bubble_improved(rgb_image, position, assoc['dimension_id'])
         
         # Convert back to PIL
-        result_pil = Image.fromarray(cv2.cvtColor(result_image, cv2.COLOR_BGR2RGB))
+        result_pil = Image.fromarray(rgb_image)
         
         logger.info(f"Added {len(associations)} dimension bubbles")
         return result_pil
     
-    def process_pdf_improved(self, input_pdf_path, output_dir, use_manual=False):
-        """Process entire PDF with improved algorithms."""
-        # Convert PDF to images
-        images = self.pdf_to_images(input_pdf_path)
-        if not images:
+    def encode_png(self, image):
+        """Encode a PIL image as PNG bytes."""
+        buffer = io.BytesIO()
+        image.save(buffer, "PNG", compress_level=self.png_compress_level)
+        return buffer.getvalue()
+    
+    def save_page(self, output_dir, page_index, png_bytes, output_zip=None):
+        """Write an annotated page to the output directory or zip archive."""
+        filename = f"page_{page_index+1:03d}_bubbled.png"
+        if output_zip is not None:
+            output_zip.writestr(filename, png_bytes)
+            logger.info(f"Added annotated page to archive: {filename}")
+            return
+        
+        output_path = os.path.join(output_dir, filename)
+        with open(output_path, "wb") as f:
+            f.write(png_bytes)
+        logger.info(f"Saved annotated page: {output_path}")
+    
+    def process_pdf_improved(self, input_pdf, output_dir, use_manual=False, max_workers=None,
+                             output_zip=None):
+        """Process entire PDF with improved algorithms.
+        
+        Pages are rasterized and annotated in parallel across max_workers
+        processes (defaults to the CPU count). Workers are sent page numbers
+        and read the PDF themselves, and at most max_workers + 1 pages are in
+        flight at a time, so memory use stays bounded on long documents.
+        
+        If output_zip is an open zipfile.ZipFile, pages are written straight
+        into it instead of to output_dir, which may then be None.
+        """
+        # Check the PDF can be read before rasterizing pages on demand
+        page_count = self.get_page_count(input_pdf)
+        if not page_count:
             logger.error("Failed to convert PDF to images")
             return False
         
         # Create output directory
-        os.makedirs(output_dir, exist_ok=True)
+        if output_zip is None:
+            os.makedirs(output_dir, exist_ok=True)
         
-        # Process each page
-        for i, image in enumerate(images):
-            logger.info(f"Processing page {i+1}/{len(images)}")
-            
-            # Process image
-            annotated_image = self.process_image_improved(image, use_manual)
-            
-            # Save annotated image
-            output_path = os.path.join(output_dir, f"page_{i+1:03d}_bubbled.png")
-            annotated_image.save(output_path, "PNG")
-            logger.info(f"Saved annotated page: {output_path}")
+        max_workers = max_workers or os.cpu_count() or 1
+        
+        try:
+            if max_workers == 1:
+                # Process each page in this process
+                for i, image in enumerate(self.iter_pages(input_pdf, self.dpi, page_count)):
+                    logger.info(f"Processing page {i+1}/{page_count}")
+                    annotated_image = self.process_image_improved(image, use_manual)
+                    self.save_page(output_dir, i, self.encode_png(annotated_image), output_zip)
+            else:
+                with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                         initargs=(self,)) as executor:
+                    pending = {}
+                    
+                    def save_finished(return_when):
+                        done, _ = wait(pending, return_when=return_when)
+                        for future in done:
+                            self.save_page(output_dir, pending.pop(future), future.result(),
+                                           output_zip)
+                    
+                    for i in range(page_count):
+                        if len(pending) > max_workers:
+                            save_finished(FIRST_COMPLETED)
+                        logger.info(f"Processing page {i+1}/{page_count}")
+                        future = executor.submit(_process_page_worker, input_pdf, i + 1,
+                                                 use_manual)
+                        pending[future] = i
+                    
+                    save_finished(ALL_COMPLETED)
+        except Exception as e:
+            logger.error(f"Error processing PDF: {e}")
+            return False
         
-        logger.info(f"Processing complete. Annotated images saved to: {output_dir}")
+        destination = output_zip.filename if output_zip is not None else output_dir
+        logger.info(f"Processing complete. Annotated images saved to: {destination}")
         return True
 
+def positive_int(value):
+    """argparse type accepting only integers greater than zero."""
+    number = int(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be a positive integer: {value}")
+    return number
+
 def main():
     parser = argparse.ArgumentParser(description="Improved bubble drawing tool for PDF technical drawings")
     parser.add_argument("input_pdf", help="Path to input PDF file")
@@ -340,6 +462,12 @@ def main():
                        help="Output directory for annotated images")
     parser.add_argument("-m", "--manual", action="store_true",
                        help="Use manual dimension placement for demonstration")
+    parser.add_argument("--dpi", type=positive_int, default=300,
+                       help="Resolution of the annotated output pages (default: 300)")
+    parser.add_argument("--analysis-dpi", type=positive_int, default=150,
+                       help="Resolution used for line and text detection (default: 150)")
+    parser.add_argument("-j", "--jobs", type=positive_int, default=None,
+                       help="Number of pages to process in parallel (default: CPU count)")
     parser.add_argument("-v", "--verbose", action="store_true", 
                        help="Enable verbose logging")
     
@@ -354,8 +482,8 @@ def main():
         sys.exit(1)
     
     # Create tool instance and process PDF
-    tool = ImprovedBubbleDrawingTool()
-    success = tool.process_pdf_improved(args.input_pdf, args.output, args.manual)
+    tool = ImprovedBubbleDrawingTool(args.dpi, args.analysis_dpi)
+    success = tool.process_pdf_improved(args.input_pdf, args.output, args.manual, args.jobs)
     
     if success:
         logger.info("Improved bubble drawing tool completed successfully!")
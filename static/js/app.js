@@ -150,6 +150,8 @@ function trackProgress(jobId, callback) {
                     callback(null, data);
                 } else if (data.status === 'processing') {
                     setTimeout(checkStatus, 2000); // Check again in 2 seconds
+                } else if (data.status === 'failed') {
+                    callback(new Error(data.error || 'Processing failed'), null);
                 } else {
                     callback(new Error('Job not found'), null);
                 }
@@ -8,8 +8,14 @@ Author: Manus AI
 """
 
 import os
+import time
 import uuid
+import fcntl
+import hashlib
 import zipfile
+import tempfile
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from flask import Flask, request, render_template, send_file, jsonify, redirect, url_for
 from werkzeug.utils import secure_filename
@@ -21,11 +27,9 @@ from improved_bubble_tool import ImprovedBubbleDrawingTool
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-here')
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['OUTPUT_FOLDER'] = 'outputs'
 
 # Create necessary directories
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['OUTPUT_FOLDER'], exist_ok=True)
 os.makedirs('static', exist_ok=True)
 
@@ -36,10 +40,137 @@ logger = logging.getLogger(__name__)
 # Initialize the bubble drawing tool
 bubble_tool = ImprovedBubbleDrawingTool()
 
+# Pages processed in parallel per job; each worker holds a full-resolution
+# page, so keep this small on memory-constrained dynos
+MAX_PAGE_WORKERS = int(os.environ.get('MAX_PAGE_WORKERS', 2))
+
+# Run processing jobs in the background so requests return immediately.
+# One job at a time per web process, since each job already spreads its
+# pages over a process pool.
+job_executor = ThreadPoolExecutor(max_workers=1)
+
+# A job whose started marker is older than this is assumed to have died.
+# The marker is rewritten when the job leaves the queue, so time spent
+# waiting behind other jobs does not count.
+JOB_TIMEOUT_SECONDS = int(os.environ.get('JOB_TIMEOUT_SECONDS', 3600))
+
+# Content types browsers send for PDFs (some fall back to a generic type)
+ALLOWED_MIMETYPES = {'application/pdf', 'application/x-pdf', 'application/octet-stream'}
+
+# Size of each read from the upload stream
+UPLOAD_CHUNK_SIZE = 1 << 20
+
 def allowed_file(filename):
     """Check if the uploaded file is a PDF."""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() == 'pdf'
 
+def looks_like_pdf(header):
+    """Check for the PDF signature, which may follow up to 1 KB of leading junk."""
+    return b'%PDF-' in header[:1024]
+
+def job_is_running(output_dir):
+    """Check whether a job directory's started marker belongs to a live job.
+    
+    Jobs only live in an in-memory executor, so a job is dead once the
+    process that claimed it has exited or the timeout has passed.
+    """
+    try:
+        with open(os.path.join(output_dir, 'started')) as f:
+            pid, started_at = f.read().split()
+        pid, started_at = int(pid), float(started_at)
+    except (FileNotFoundError, ValueError):
+        return False
+    
+    if time.time() - started_at > JOB_TIMEOUT_SECONDS:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Process exists but belongs to another user
+    return True
+
+def write_started_marker(output_dir):
+    """Record this process and the current time as the job's owner.
+    
+    The marker is renamed into place so /status never reads a partial one.
+    """
+    started_path = os.path.join(output_dir, 'started')
+    partial_path = f"{started_path}.{uuid.uuid4().hex}.part"
+    with open(partial_path, 'w') as f:
+        f.write(f"{os.getpid()} {time.time()}")
+    os.replace(partial_path, started_path)
+
+def claim_job(output_dir):
+    """Claim a job directory for processing.
+    
+    Returns False if the results already exist or a live job is working on
+    them. Failed and dead jobs can be claimed again. Claims are serialized
+    with a lock file so concurrent uploads of the same PDF start one job.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    error_path = os.path.join(output_dir, 'error.txt')
+    
+    with open(os.path.join(output_dir, 'claim.lock'), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        
+        if os.path.exists(os.path.join(output_dir, 'results.zip')):
+            return False
+        if not os.path.exists(error_path) and job_is_running(output_dir):
+            return False
+        
+        # Clear a previous failure and record who owns the job
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(error_path)
+        write_started_marker(output_dir)
+        return True
+
+def process_to_zip(pdf_path, output_dir, use_manual):
+    """Process a PDF file, writing the annotated pages straight into results.zip."""
+    zip_path = os.path.join(output_dir, 'results.zip')
+    
+    # Build the archive under a name unique to this job so results.zip only
+    # appears once it is complete, even if a retry of a job wrongly
+    # presumed dead is writing the same directory
+    partial_path = f"{zip_path}.{uuid.uuid4().hex}.part"
+    try:
+        with zipfile.ZipFile(partial_path, 'w', compression=zipfile.ZIP_STORED) as zipf:
+            success = bubble_tool.process_pdf_improved(pdf_path, None, use_manual,
+                                                       max_workers=MAX_PAGE_WORKERS,
+                                                       output_zip=zipf)
+    except Exception:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(partial_path)
+        raise
+    
+    if success:
+        os.replace(partial_path, zip_path)
+    else:
+        os.remove(partial_path)
+    return success
+
+def run_job(job_id, pdf_path, output_dir, use_manual, remove_input=False):
+    """Process a PDF in the background, recording any failure for /status."""
+    error = None
+    try:
+        # Restart the timeout now that the job has left the queue
+        write_started_marker(output_dir)
+        logger.info(f"Processing job {job_id}")
+        if not process_to_zip(pdf_path, output_dir, use_manual):
+            error = 'Processing failed'
+    except Exception as e:
+        logger.error(f"Error processing job {job_id}: {e}")
+        error = f'Processing error: {str(e)}'
+    finally:
+        if remove_input:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(pdf_path)
+    
+    if error:
+        with open(os.path.join(output_dir, 'error.txt'), 'w') as f:
+            f.write(error)
+
 @app.route('/')
 def index():
     """Main page with upload form."""
@@ -55,50 +186,65 @@ def upload_file():
     if file.filename == '':
         return jsonify({'error': 'No file selected'}), 400
     
-    if not allowed_file(file.filename):
+    if not allowed_file(file.filename) or file.mimetype not in ALLOWED_MIMETYPES:
         return jsonify({'error': 'Only PDF files are allowed'}), 400
     
     try:
-        # Generate unique ID for this processing job
-        job_id = str(uuid.uuid4())
-        
-        # Save uploaded file
-        filename = secure_filename(file.filename)
-        input_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{job_id}_{filename}")
-        file.save(input_path)
-        
-        # Create output directory for this job
-        output_dir = os.path.join(app.config['OUTPUT_FOLDER'], job_id)
-        os.makedirs(output_dir, exist_ok=True)
-        
-        # Get processing mode from form
-        use_manual = request.form.get('mode') == 'manual'
-        
-        # Process the PDF
-        logger.info(f"Processing job {job_id}: {filename}")
-        success = bubble_tool.process_pdf_improved(input_path, output_dir, use_manual)
+        # Check the signature on the first chunk before reading the rest
+        first_chunk = file.stream.read(UPLOAD_CHUNK_SIZE)
+        if not looks_like_pdf(first_chunk):
+            return jsonify({'error': 'Only PDF files are allowed'}), 400
         
-        if success:
-            # Create a zip file with all results
-            zip_path = os.path.join(output_dir, 'results.zip')
-            with zipfile.ZipFile(zip_path, 'w') as zipf:
-                for root, dirs, files in os.walk(output_dir):
-                    for file in files:
-                        if file != 'results.zip':  # Don't include the zip in itself
-                            file_path = os.path.join(root, file)
-                            arcname = os.path.relpath(file_path, output_dir)
-                            zipf.write(file_path, arcname)
+        # pdftoppm needs a path that outlives the request, so copy the upload
+        # to a spool file, hashing it as it is written. Queued jobs hold only
+        # the path, not the file contents.
+        digest = hashlib.md5(first_chunk)
+        spool_file = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False)
+        pdf_path = spool_file.name
+        queued = False
+        try:
+            with spool_file:
+                spool_file.write(first_chunk)
+                for chunk in iter(lambda: file.stream.read(UPLOAD_CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    spool_file.write(chunk)
             
-            # Clean up input file
-            os.remove(input_path)
+            # Get processing mode from form
+            use_manual = request.form.get('mode') == 'manual'
             
-            return jsonify({
-                'success': True,
-                'job_id': job_id,
-                'message': 'Processing completed successfully!'
-            })
-        else:
-            return jsonify({'error': 'Processing failed'}), 500
+            # Key the job by file content and mode so identical uploads share results
+            mode = 'manual' if use_manual else 'auto'
+            job_id = f"{digest.hexdigest()}_{mode}"
+            output_dir = os.path.join(app.config['OUTPUT_FOLDER'], job_id)
+            
+            # If the same file is already done or still being processed, point
+            # the client at that job instead of starting another
+            if not claim_job(output_dir):
+                logger.info(f"Reusing results for job {job_id}")
+                return jsonify({
+                    'success': True,
+                    'job_id': job_id,
+                    'message': 'Using cached results'
+                })
+            
+            filename = secure_filename(file.filename)
+            
+            # Queue the spooled PDF for processing; the client polls /status/<job_id>
+            logger.info(f"Queued job {job_id}: {filename}")
+            job_executor.submit(run_job, job_id, pdf_path, output_dir, use_manual,
+                                remove_input=True)
+            queued = True
+        finally:
+            # Once the job is queued run_job owns the spool file; until then
+            # remove it here, including on cache hits and errors
+            if not queued:
+                os.remove(pdf_path)
+        
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'message': 'Processing started'
+        })
             
     except Exception as e:
         logger.error(f"Error processing file: {e}")
@@ -123,10 +269,17 @@ def job_status(job_id):
     output_dir = os.path.join(app.config['OUTPUT_FOLDER'], job_id)
     zip_path = os.path.join(output_dir, 'results.zip')
     
+    error_path = os.path.join(output_dir, 'error.txt')
+    
     if os.path.exists(zip_path):
         return jsonify({'status': 'completed', 'download_url': url_for('download_results', job_id=job_id)})
-    elif os.path.exists(output_dir):
+    elif os.path.exists(error_path):
+        with open(error_path) as f:
+            return jsonify({'status': 'failed', 'error': f.read()})
+    elif job_is_running(output_dir):
         return jsonify({'status': 'processing'})
+    elif os.path.exists(output_dir):
+        return jsonify({'status': 'failed', 'error': 'Processing was interrupted, please try again'})
     else:
         return jsonify({'status': 'not_found'}), 404
 
@@ -147,29 +300,15 @@ def demo_process():
         # Generate unique ID for demo
         job_id = f"demo_{str(uuid.uuid4())[:8]}"
         output_dir = os.path.join(app.config['OUTPUT_FOLDER'], job_id)
-        os.makedirs(output_dir, exist_ok=True)
+        claim_job(output_dir)
         
-        # Process with manual mode for demo
-        success = bubble_tool.process_pdf_improved(demo_pdf_path, output_dir, use_manual=True)
+        # Queue with manual mode for demo; the client polls /status/<job_id>
+        job_executor.submit(run_job, job_id, demo_pdf_path, output_dir, use_manual=True)
         
-        if success:
-            # Create zip file
-            zip_path = os.path.join(output_dir, 'results.zip')
-            with zipfile.ZipFile(zip_path, 'w') as zipf:
-                for root, dirs, files in os.walk(output_dir):
-                    for file in files:
-                        if file != 'results.zip':
-                            file_path = os.path.join(root, file)
-                            arcname = os.path.relpath(file_path, output_dir)
-                            zipf.write(file_path, arcname)
-            
-            return jsonify({
-                'success': True,
-                'job_id': job_id,
-                'download_url': url_for('download_results', job_id=job_id)
-            })
-        else:
-            return jsonify({'error': 'Demo processing failed'}), 500
+        return jsonify({
+            'success': True,
+            'job_id': job_id
+        })
             
     except Exception as e:
         logger.error(f"Demo processing error: {e}")